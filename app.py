@@ -24,7 +24,8 @@ from dotenv import load_dotenv
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from sqlalchemy import func
+from sqlalchemy import func, update, insert, select, exists, or_, literal
+from sqlalchemy.exc import IntegrityError
 
 
 # -------------------------
@@ -59,6 +60,8 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(level=logging.INFO)
 
 MAX_IMAGES = 5
+IMAGE_MAX_SIZE = 800  # longest edge sent to the model; the browser downscales to this before upload
+IMAGE_JPEG_QUALITY = 65
 
 # -------------------------
 # SYSTEM PROMPT (YOUR ORIGINAL)
@@ -179,6 +182,12 @@ class PromoCode(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class PromoRedemption(db.Model):
+    # Not created automatically on existing databases - apply
+    # migrations/001_promo_redemption_unique.sql. redeem_promo() needs it.
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "promo_id", name="uq_promo_redemption_user_promo"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     promo_id = db.Column(db.Integer, db.ForeignKey("promo_code.id"), nullable=False)
@@ -268,10 +277,13 @@ def generate_listing(images):
 
     for image in images:
         img = Image.open(image)
-        img.thumbnail((800, 800))
+        # Originals from clients without canvas support: let the JPEG decoder
+        # scale down while decoding instead of inflating the full-res frame.
+        img.draft("RGB", (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+        img.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
 
         buffer = io.BytesIO()
-        img.convert("RGB").save(buffer, format="JPEG", quality=65)
+        img.convert("RGB").save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY)
         buffer.seek(0)
 
         encoded_image = base64.b64encode(buffer.read()).decode("utf-8")
@@ -489,6 +501,62 @@ def reset_password(token):
 
     return render_template("reset_password.html")
 
+# -------------------------
+# PROMO REDEMPTION
+# -------------------------
+
+# Claims a use, records the redemption and credits the user in ONE statement,
+# so concurrent redemptions can't overshoot max_uses. The unique constraint on
+# (user_id, promo_id) catches a user racing themselves.
+# Returns the credits granted, or None if the code could not be claimed.
+def redeem_promo(user_id, code):
+    claimed = (
+        update(PromoCode)
+        .where(
+            PromoCode.code == code,
+            PromoCode.is_active.is_(True),
+            or_(
+                PromoCode.max_uses.is_(None),
+                PromoCode.max_uses == 0,  # 0 = unlimited, same as None
+                PromoCode.uses_count < PromoCode.max_uses
+            ),
+            ~exists().where(
+                PromoRedemption.user_id == user_id,
+                PromoRedemption.promo_id == PromoCode.id
+            )
+        )
+        .values(uses_count=PromoCode.uses_count + 1)
+        .returning(PromoCode.id, PromoCode.credits)
+        .cte("claimed")
+    )
+
+    redeemed = (
+        insert(PromoRedemption)
+        .from_select(
+            ["user_id", "promo_id", "redeemed_at"],
+            select(literal(user_id), claimed.c.id, literal(datetime.utcnow()))
+        )
+        .returning(PromoRedemption.user_id, PromoRedemption.promo_id)
+        .cte("redeemed")
+    )
+
+    stmt = (
+        update(User)
+        .where(User.id == redeemed.c.user_id, claimed.c.id == redeemed.c.promo_id)
+        .values(credits=User.credits + claimed.c.credits)
+        .returning(claimed.c.credits)
+    )
+
+    try:
+        # Core execution: the ORM bulk-update path drops RETURNING of CTE columns
+        credits = db.session.connection().execute(stmt).scalar()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+    return credits
+
 @app.route("/redeem", methods=["POST"])
 @login_required
 def redeem_code():
@@ -498,42 +566,24 @@ def redeem_code():
         session["listing"] = "Please enter a promo code."
         return redirect(url_for("index"))
 
-    promo = PromoCode.query.filter_by(code=code_input).first()
-
-    if not promo or not promo.is_active:
-        session["listing"] = "Invalid or inactive code."
-        return redirect(url_for("index"))
+    credits = redeem_promo(current_user.id, code_input)
 
-    # Check usage limit
-    if promo.max_uses and promo.uses_count >= promo.max_uses:
-        session["listing"] = "This code has reached its usage limit."
+    if credits is not None:
+        session["listing"] = f"Promo applied! {credits} credits added."
         return redirect(url_for("index"))
 
-    # Check if THIS user already redeemed
-    existing = PromoRedemption.query.filter_by(
-        user_id=current_user.id,
-        promo_id=promo.id
-    ).first()
+    # Redemption failed - work out why for the message
+    promo = PromoCode.query.filter_by(code=code_input).first()
 
-    if existing:
+    if not promo or not promo.is_active:
+        session["listing"] = "Invalid or inactive code."
+    elif PromoRedemption.query.filter_by(user_id=current_user.id, promo_id=promo.id).first():
         session["listing"] = "You have already used this code."
-        return redirect(url_for("index"))
-
-    # Apply credits
-    user = User.query.get(current_user.id)
-    user.credits += promo.credits
-
-    promo.uses_count += 1
-
-    redemption = PromoRedemption(
-        user_id=user.id,
-        promo_id=promo.id
-    )
-
-    db.session.add(redemption)
-    db.session.commit()
+    elif promo.max_uses and promo.uses_count >= promo.max_uses:
+        session["listing"] = "This code has reached its usage limit."
+    else:
+        session["listing"] = "Could not apply this code. Please try again."
 
-    session["listing"] = f"Promo applied! {promo.credits} credits added."
     return redirect(url_for("index"))
 
 @app.route("/admin/promos")
@@ -619,6 +669,7 @@ def index():
             return redirect(url_for("index"))
 
         images = request.files.getlist("images")
+        logging.info(f"Upload size: {request.content_length} bytes for {len(images)} images")
 
         if not images or images[0].filename == "":
             session["listing"] = "Please upload at least one image."
@@ -674,7 +725,13 @@ def index():
 
         return redirect(url_for("index"))
 
-    return render_template("index.html", listing=listing)
+    return render_template(
+        "index.html",
+        listing=listing,
+        max_images=MAX_IMAGES,
+        image_max_size=IMAGE_MAX_SIZE,
+        image_jpeg_quality=IMAGE_JPEG_QUALITY
+    )
 
 
 if __name__ == "__main__":
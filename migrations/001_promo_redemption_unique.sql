@@ -0,0 +1,25 @@
+-- Unique (user_id, promo_id) on promo_redemption.
+-- redeem_promo() in app.py relies on this to stop a user redeeming the same
+-- code twice from concurrent requests. Apply once against the production DB:
+--   psql "$DATABASE_URL" -f migrations/001_promo_redemption_unique.sql
+
+BEGIN;
+
+-- Drop duplicate redemptions left by the old race, keeping the earliest one
+DELETE FROM promo_redemption a
+USING promo_redemption b
+WHERE a.user_id = b.user_id
+  AND a.promo_id = b.promo_id
+  AND a.id > b.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_promo_redemption_user_promo'
+    ) THEN
+        ALTER TABLE promo_redemption
+            ADD CONSTRAINT uq_promo_redemption_user_promo UNIQUE (user_id, promo_id);
+    END IF;
+END $$;
+
+COMMIT;
@@ -0,0 +1,137 @@
+"""
+Parallel stress test for promo redemption (redeem_promo in app.py).
+
+Fires concurrent redemptions of ONE promo code from many users, with every
+user also racing itself, then checks nothing overshot max_uses and nobody
+was credited twice. Reports redemptions per second.
+
+Needs a PostgreSQL DATABASE_URL. Creates missing tables, uses its own
+STRESS-* code and @stress.invalid users, and deletes them when done:
+
+    DATABASE_URL=postgresql://... python scripts/stress_redeem.py --users 2000 --max-uses 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# app.py reads these at import time; the OpenAI client is never called here
+os.environ.setdefault("SECRET_KEY", "stress-test")
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import app, db, User, PromoCode, PromoRedemption, redeem_promo  # noqa: E402
+
+START_CREDITS = 10
+
+
+def attempt(user_id, code):
+    with app.app_context():
+        return user_id, redeem_promo(user_id, code)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=3, help="concurrent attempts per user")
+    parser.add_argument("--max-uses", type=int, default=50, help="0 = unlimited")
+    parser.add_argument("--credits", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads (default: connection pool size + overflow)")
+    args = parser.parse_args()
+
+    tag = str(int(time.time() * 1000))
+    code = f"STRESS-{tag}"
+
+    with app.app_context():
+        db.create_all()
+
+        engine_pool = db.engine.pool
+        workers = args.workers or (engine_pool.size() + engine_pool._max_overflow)
+
+        promo = PromoCode(code=code, credits=args.credits, max_uses=args.max_uses, is_active=True)
+        db.session.add(promo)
+
+        users = [
+            User(email=f"{tag}-{i}@stress.invalid", password_hash="x", credits=START_CREDITS)
+            for i in range(args.users)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+
+        promo_id = promo.id
+        user_ids = [u.id for u in users]
+
+    # Copies of the same user sit next to each other so they run at the same time
+    attempts = [uid for uid in user_ids for _ in range(args.repeats)]
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda uid: attempt(uid, code), attempts))
+        elapsed = time.perf_counter() - start
+
+        granted = {}
+        for user_id, credits in results:
+            if credits is not None:
+                granted[user_id] = granted.get(user_id, 0) + 1
+
+        with app.app_context():
+            promo = db.session.get(PromoCode, promo_id)
+            redemptions = PromoRedemption.query.filter_by(promo_id=promo_id).count()
+            credited = {
+                u.id: u.credits
+                for u in User.query.filter(User.id.in_(user_ids))
+            }
+            uses_count = promo.uses_count
+
+        expected = min(args.max_uses, args.users) if args.max_uses else args.users
+
+        failures = []
+        if uses_count != expected:
+            failures.append(f"uses_count {uses_count} != expected {expected}")
+        if redemptions != uses_count:
+            failures.append(f"promo_redemption rows {redemptions} != uses_count {uses_count}")
+        if len(granted) != expected:
+            failures.append(f"{len(granted)} users redeemed, expected {expected}")
+
+        doubled = [uid for uid, n in granted.items() if n > 1]
+        if doubled:
+            failures.append(f"{len(doubled)} users redeemed more than once")
+
+        wrong_credits = [
+            uid for uid, credits in credited.items()
+            if credits != START_CREDITS + (args.credits if uid in granted else 0)
+        ]
+        if wrong_credits:
+            failures.append(f"{len(wrong_credits)} users have the wrong credit balance")
+
+        print(f"attempts:      {len(attempts)} ({args.users} users x {args.repeats}, {workers} threads)")
+        print(f"max_uses:      {args.max_uses or 'unlimited'}")
+        print(f"redeemed:      {len(granted)} (uses_count={uses_count}, rows={redemptions})")
+        print(f"elapsed:       {elapsed:.2f}s")
+        print(f"attempts/sec:  {len(attempts) / elapsed:.0f}")
+        print(f"redeemed/sec:  {len(granted) / elapsed:.0f}")
+
+        if failures:
+            print("FAILED:")
+            for failure in failures:
+                print(f"  - {failure}")
+            return 1
+
+        print("OK")
+        return 0
+
+    finally:
+        with app.app_context():
+            PromoRedemption.query.filter_by(promo_id=promo_id).delete()
+            PromoCode.query.filter_by(id=promo_id).delete()
+            User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    sys.exit(main())